@@ -1,12 +1,19 @@
 # Code by Sergio00166
 
 from time import sleep as delay
-from sys import argv
+import sys
 from copy import deepcopy
 from multiprocessing import Pool,cpu_count
-from functools import partial
-from time import time
+from multiprocessing.pool import ThreadPool
+from time import time,perf_counter
 from threading import Thread
+from random import Random
+import tracemalloc
+from cProfile import Profile
+from pstats import Stats
+from os.path import basename
+try: from concurrent.futures import InterpreterPoolExecutor
+except ImportError: InterpreterPoolExecutor = None
 
 
 """ DEFINE VERTEX DATA """
@@ -58,24 +65,124 @@ def mid_points(vertex):
              round(y1+step_y*(i+1)))\
             for i in range(num_points)]
 
+def unique_cords(vertex):
+    return list(set(tuple(coord) for sublist in vertex for coord in sublist))
+
 def raster(vertex,vbuff,color=1, fill=False):
     buffer=deepcopy(vbuff)
-    cords = list(set(tuple(coord) for sublist in vertex for coord in sublist))
+    cords = unique_cords(vertex)
     for x in vertex: cords+=mid_points(x)
     if fill: cords = fill_polygon(cords)
     for x in cords: buffer[x[1]][x[0]]=color
     return buffer
 
-def wk(x,vbuff):
+def wk(x):
     cube_moved = [ [[coord[0][0]+x, coord[0][1]],\
     [coord[1][0]+x, coord[1][1]]] for coord in cube ]
-    vbuff = raster(cube_moved, vbuff, fill=True)
+    vbuff = raster(cube_moved, shared_vbuff, fill=True)
+
+
+
+""" EXECUTOR SELECTION """
+
+shared_vbuff = None
+
+def init_worker(vbuff):
+    # Hands the base buffer to each worker once instead of with every task
+    global shared_vbuff
+    shared_vbuff = vbuff
+
+class InterpPool:
+    # Gives InterpreterPoolExecutor the Pool calls used by compute()
+    def __init__(self,processes,initializer,initargs):
+        self.exe=InterpreterPoolExecutor(max_workers=processes,\
+                 initializer=initializer,initargs=initargs)
+    def map(self,func,data): return list(self.exe.map(func,data))
+    def close(self): self.exe.shutdown(wait=True,cancel_futures=True)
+
+executors = {"process": Pool, "thread": ThreadPool}
+if InterpreterPoolExecutor is not None: executors["interp"]=InterpPool
+
+def gil_enabled():
+    # Python < 3.13 has no free-threaded build, so the GIL is always on
+    check=getattr(sys,"_is_gil_enabled",None)
+    return True if check is None else check()
+
+
+
+""" PROFILING HOOKS """
+
+# Hot-path functions whose allocations are measured in profiled workers
+traced = { func.__code__ for func in\
+           (deepcopy,unique_cords,mid_points,fill_polygon,raster) }
+allocs = {}; frames = []; pending = []
+
+def label(file,line,name):
+    return "%s (%s:%d)" % (name,basename(file),line) if line else name
+
+def settle_blocks():
+    # Counts blocks once the returned frame and its locals are released
+    total,start=pending.pop(); total[0]+=sys.getallocatedblocks()-start
+
+def alloc_hook(frame,event,arg):
+    # Profile hook recording net blocks and peak bytes of the outermost
+    # call of each traced function. Every frame keeps its own running
+    # peak, and a child's peak is folded into it when the child returns.
+    # Blocks are settled on the next event, after the frame is cleared.
+    if pending: settle_blocks()
+    code=frame.f_code
+    if not code in traced: return
+    if event=="call":
+        if any(rec[0].f_code is code for rec in frames): return
+        current,peak=tracemalloc.get_traced_memory()
+        if frames: frames[-1][3]=max(frames[-1][3],peak)
+        rec=[frame,current,0,current]; frames.append(rec)
+        tracemalloc.reset_peak(); rec[2]=sys.getallocatedblocks()
+    elif event=="return" and frames and frames[-1][0] is frame:
+        rec=frames.pop(); peak=max(rec[3],tracemalloc.get_traced_memory()[1])
+        total=allocs.setdefault(label(code.co_filename,\
+              code.co_firstlineno,code.co_name),[0,0])
+        total[1]=max(total[1],peak-rec[1]); pending.append((total,rec[2]))
+        if frames: frames[-1][3]=max(frames[-1][3],peak)
+        tracemalloc.reset_peak()
+
+def prof_wk(x):
+    # Runs wk() once under cProfile for timings and once under alloc_hook
+    # for allocations, so neither measurement includes the other's cost.
+    # Returns (wall time, per-function stats)
+    start=perf_counter(); prof=Profile()
+    prof.enable(); wk(x); prof.disable()
+    allocs.clear(); tracemalloc.start()
+    sys.setprofile(alloc_hook); wk(x); sys.setprofile(None)
+    if pending: settle_blocks()
+    tracemalloc.stop(); stats={}
+    for (file,line,name),(cc,nc,tt,ct,callers) in Stats(prof).stats.items():
+        if "_lsprof" in name: continue
+        key=label(file,line,name)
+        stats[key]=[nc,tt,ct]+allocs.get(key,[0,0])
+    return perf_counter()-start,stats
+
+def merge_stats(total,stats):
+    for key,(nc,tt,ct,blocks,peak) in stats.items():
+        rec=total.setdefault(key,[0,0,0,0,0])
+        rec[0]+=nc; rec[1]+=tt; rec[2]+=ct
+        rec[3]+=blocks; rec[4]=max(rec[4],peak)
+
+def print_report(stats,top=12):
+    total=sum(x[1] for x in stats.values()) or 1
+    print("   %-36s %9s %9s %6s %9s %10s %9s" % ("Function","Calls",\
+          "Own(s)","Own%","Cum(s)","Blocks","Peak KiB"))
+    ranked=sorted(stats.items(),key=lambda x: x[1][1],reverse=True)
+    for key,(nc,tt,ct,blocks,peak) in ranked[:top]:
+        mem=("%10d %9.1f" % (blocks,peak/1024)) if peak else "%10s %9s" % ("-","-")
+        print("   %-36s %9d %9.3f %5.1f%% %9.3f %s" %\
+              (key[:36],nc,tt,tt/total*100,ct,mem))
 
 
 
 """ BENCHMARKER FUNCTION """
 
-def compute(cpu,max_time):
+def compute(cpu,max_time,executor="process",stats=None):
     vbuff = init_scr(512, 384)
     vbuff=raster(margin,vbuff)
     blank=deepcopy(vbuff)
@@ -91,32 +198,51 @@ def compute(cpu,max_time):
             if cont>0: break
         x += speed
 
-    pool = Pool(processes=cpu)
-    worker = partial(wk, vbuff=vbuff)
-    passes,elapsed,data = 0,0,data*cpu
+    pool = executors[executor](processes=cpu,\
+           initializer=init_worker,initargs=(vbuff,))
+    data = data*cpu
 
-    while True:
-        proc=pool.map_async(worker,data)
-        start=time(); proc.get()
-        elapsed+=time()-start
-        passes += 1
-        if elapsed>max_time:
-            pool.close()
-            return passes/elapsed*10000*cpu
+    if stats is not None:
+        # Profiled tasks are far slower than a pass allows, so sample them
+        # in shuffled order, one task per worker at a time, until time is up
+        order=data[:]; Random(0).shuffle(order)
+        tasks,busy,start = 0,0,time()
+        while True:
+            batch=[order[(tasks+i)%len(order)] for i in range(cpu)]
+            for wall,result in pool.map(prof_wk,batch):
+                busy+=wall; merge_stats(stats,result)
+            tasks+=cpu
+            if time()-start>max_time: break
+        elapsed=time()-start; pool.close()
+        # Worker-slot time not spent inside prof_wk(): pickling, queues, idle
+        idle=max(elapsed*cpu-busy,0)
+        stats["pool dispatch"]=[tasks//cpu,idle,idle,0,0]
+        return tasks/len(data)/elapsed*10000*cpu
+
+    # One task per worker at a time, so max_time is checked between batches
+    # instead of after a whole pass of len(data) tasks
+    tasks,start = 0,time()
+    try:
+        while True:
+            batch=[data[(tasks+i)%len(data)] for i in range(cpu)]
+            pool.map(wk,batch); tasks+=cpu
+            elapsed=time()-start
+            if elapsed>max_time: return tasks/len(data)/elapsed*10000*cpu
+    finally: pool.close()
 
 
 
 """ USER INTERFACE AND CONTROL """
 
-def benchmark():
+def benchmark(executor="process"):
     delay(0.5); print(""); prog=""; percent=0
-    print("      Python CPUBench v4.3 ",end="\n\n")
+    print("      Python CPUBench v4.5 ",end="\n\n")
     print("\r  Running Single-Core benchmark... ",end="")
-    onec=int( compute(1,30) )
+    onec=int( compute(1,30,executor) )
     print("DONE",end="");  delay(1)
     print("\r"+" "*64,end="")
     print("\r  Running Multi-Core benchmark... ",end="")
-    allc=int( compute( cpu_count(),30 ) )
+    allc=int( compute( cpu_count(),30,executor ) )
     print("DONE",end="")
     delay(0.5)
     print("\r"+" "*64+"\r      Printing results... ",end="")
@@ -125,6 +251,40 @@ def benchmark():
     print("\r   Multi-Core  performance: "+str(allc)+"\n")
 
 
+def compare(max_time=10):
+    delay(0.5); print("")
+    print("      Python CPUBench v4.5 - executor comparison",end="\n\n")
+    gil="enabled" if gil_enabled() else "disabled"
+    print("   Python %d.%d.%d, GIL %s, %d CPUs\n" % (*sys.version_info[:3],gil,cpu_count()))
+    print("   Executor   Single-Core   Multi-Core   Scaling")
+    for name in executors:
+        print("\r   Running "+name+" benchmark... ",end="")
+        try:
+            onec=int( compute(1,max_time,name) )
+            allc=int( compute( cpu_count(),max_time,name ) )
+        except Exception as e:
+            print("\r   %-8s failed: %s: %s" % (name,type(e).__name__,e)+" "*16)
+            continue
+        scaling=allc/onec if onec else 0
+        print("\r   %-8s %13d %12d %8.2fx" % (name,onec,allc,scaling)+" "*16)
+    if "interp" not in executors:
+        print("\n   interp: concurrent.interpreters needs Python 3.14+")
+    print("")
+
+
+def profile(max_time=10):
+    delay(0.5); print("")
+    print("      Python CPUBench v4.5 - profiled run",end="\n\n")
+    if not hasattr(tracemalloc,"reset_peak"):
+        print("   Profiling needs Python 3.9+ (tracemalloc.reset_peak)\n")
+        return
+    print("\r  Running instrumented Multi-Core benchmark... ",end="")
+    stats={}
+    allc=int( compute( cpu_count(),max_time,"process",stats ) )
+    print("\r"+" "*64+"\r   Multi-Core performance: "+str(allc)+" (instrumented)\n")
+    print_report(stats); print("")
+
+
 def stress():
     proc=[]
     print("\n   PYTHON BASED CPU STRESS-TEST\n")
@@ -138,10 +298,15 @@ def stress():
 
 
 if __name__=="__main__":
-    if not len(argv)==1:
-        arg=argv[1]
+    if not len(sys.argv)==1:
+        arg=sys.argv[1]
         if arg=="stress": stress()
-        elif arg=="bench": benchmark()
-        else: print("\n   USAGE: [stress || bench]\n")
+        elif arg=="bench" and len(sys.argv)<3: benchmark()
+        elif arg=="bench" and sys.argv[2] in executors: benchmark(sys.argv[2])
+        elif arg=="compare" and len(sys.argv)<3: compare()
+        elif arg=="compare" and sys.argv[2].isdigit() and int(sys.argv[2])>0: compare(int(sys.argv[2]))
+        elif arg=="profile" and len(sys.argv)<3: profile()
+        elif arg=="profile" and sys.argv[2].isdigit() and int(sys.argv[2])>0: profile(int(sys.argv[2]))
+        else: print("\n   USAGE: [stress || bench [%s] || compare [seconds] || profile [seconds]]\n" % " | ".join(executors))
     else: stress()
 